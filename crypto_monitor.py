@@ -9,22 +9,71 @@ import os
 import sys
 import time
 import json
+import queue
+import signal
 import logging
+import threading
 import requests
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import Counter, deque
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
 from dataclasses import dataclass
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时回退到标准库json
+    orjson = None
+
+# 日志格式
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_DATEFMT = '%Y-%m-%d %H:%M:%S'
+# 日志文件按大小轮转，长期运行时占用的磁盘空间有上限
+LOG_MAX_BYTES = 32 * 1024 * 1024
+LOG_BACKUP_COUNT = 8
+
 logger = logging.getLogger(__name__)
 
+def setup_logging(level: int = logging.INFO, log_file: str = '') -> QueueListener:
+    """配置日志：调用方只将记录放入队列，格式化与输出由后台线程完成"""
+    formatter = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATEFMT)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    handlers = [console_handler]
+    
+    if log_file:
+        file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                           encoding='utf-8', delay=True)
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    
+    root_logger = logging.getLogger()
+    root_logger.handlers[:] = [QueueHandler(log_queue)]
+    root_logger.setLevel(level)
+    
+    listener.start()
+    return listener
+
+def json_dumps(obj) -> bytes:
+    """序列化为UTF-8 JSON字节串，优先使用orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+def json_loads(data: bytes):
+    """解析JSON字节串，优先使用orjson"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 class AlertType(Enum):
     """警报类型枚举"""
     PRICE_SPIKE = "price_spike"  # 价格飙升
@@ -42,10 +91,15 @@ class PushStatus(Enum):
 @dataclass
 class CryptoPrice:
     """加密货币价格数据类"""
+    # 每轮为每个交易对创建实例，使用__slots__省去实例__dict__
+    # （dataclass(slots=True)需要Python 3.10，这里手动声明以兼容3.7+；字段均无默认值）
+    __slots__ = ('symbol', 'price', 'change_24h', 'volume_24h', 'quote_volume_24h', 'timestamp')
+    
     symbol: str
     price: float
     change_24h: float
     volume_24h: float
+    quote_volume_24h: float
     timestamp: datetime
     
 @dataclass
@@ -64,6 +118,21 @@ class AlertInfo:
 class DetailedLogger:
     """详细日志输出类"""
     
+    # 图标查找表，类加载时构建一次
+    ALERT_ICONS = {
+        AlertType.PRICE_SPIKE: "🚀",
+        AlertType.PRICE_DROP: "💥",
+        AlertType.VOLUME_SURGE: "📊",
+        AlertType.INTERVAL_CHANGE: "⚡"
+    }
+    
+    STATUS_ICONS = {
+        PushStatus.SUCCESS: "✅",
+        PushStatus.FAILED: "❌",
+        PushStatus.SKIPPED: "⏭️",
+        PushStatus.PENDING: "⏳"
+    }
+    
     def __init__(self):
         self.console_width = 80
         self.separator = "=" * self.console_width
@@ -92,22 +161,8 @@ class DetailedLogger:
     
     def print_alert_details(self, alert: AlertInfo):
         """打印警报详情"""
-        alert_icons = {
-            AlertType.PRICE_SPIKE: "🚀",
-            AlertType.PRICE_DROP: "💥",
-            AlertType.VOLUME_SURGE: "📊",
-            AlertType.INTERVAL_CHANGE: "⚡"
-        }
-        
-        status_icons = {
-            PushStatus.SUCCESS: "✅",
-            PushStatus.FAILED: "❌",
-            PushStatus.SKIPPED: "⏭️",
-            PushStatus.PENDING: "⏳"
-        }
-        
-        icon = alert_icons.get(alert.alert_type, "⚠️")
-        status_icon = status_icons.get(alert.push_status, "❓")
+        icon = self.ALERT_ICONS.get(alert.alert_type, "⚠️")
+        status_icon = self.STATUS_ICONS.get(alert.push_status, "❓")
         
         print(f"{icon} 【{alert.symbol}】 {alert.alert_type.value.upper()}")
         print(f"   当前价格: ${alert.current_price:.4f}")
@@ -120,15 +175,50 @@ class DetailedLogger:
         print(f"   时间戳: {alert.timestamp.strftime('%H:%M:%S')}")
         print()
 
+class RateLimitError(Exception):
+    """Binance限频异常"""
+
 class BinanceAPI:
     """Binance API 客户端 - 增强版"""
     
-    def __init__(self, api_key: Optional[str] = None, api_secret: Optional[str] = None):
+    # 24hr行情按symbols参数请求时，超过100个交易对的权重与全量请求相同（80）
+    TICKER_SYMBOLS_LIMIT = 100
+    
+    def __init__(self, api_key: Optional[str] = None, api_secret: Optional[str] = None,
+                 pairs_cache_ttl: float = 3600, pairs_cache_file: str = ''):
         self.api_key = api_key
         self.api_secret = api_secret
         self.base_url = "https://api.binance.com"
         self.fapi_url = "https://fapi.binance.com"
         self.session = requests.Session()
+        # 现货与合约两个域名并发请求，按域名保持长连接；
+        # 只对连接错误与5xx做重试：429/418交给_get_json的冷却逻辑处理（不遵循Retry-After自动重试，
+        # 避免限频期间继续请求）；读超时不重试，避免一次超时拖长整个监控周期
+        # （read=False直接抛出原始超时异常，调用方仍按requests.Timeout处理）
+        retry = Retry(
+            total=3,
+            read=False,
+            backoff_factor=0.3,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=False,
+            raise_on_status=False
+        )
+        self.session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=retry))
+        
+        # 交易对列表缓存：exchangeInfo响应体积大且很少变化，按TTL刷新
+        self.pairs_cache_ttl = pairs_cache_ttl
+        self._pairs_cache: Dict[bool, Tuple[float, List[str]]] = {}
+        self.pairs_cache_file = pairs_cache_file
+        self._load_pairs_cache_file()
+        
+        # 限频冷却截止时间，冷却期内不再发送请求以免IP被封禁；
+        # 现货与合约域名的限频额度相互独立，按域名分别记录
+        self._cooldown_until: Dict[str, float] = {}
+        self._rate_limit_strikes: Dict[str, int] = {}
+        
+        # 被服务端以400拒绝的symbols参数（含现货不存在的交易对），相同列表直接请求全量行情
+        self._rejected_ticker_symbols: frozenset = frozenset()
         
         if self.api_key:
             self.session.headers.update({
@@ -143,33 +233,111 @@ class BinanceAPI:
         
         logger.info("Binance交易所初始化成功")
     
+    def _load_pairs_cache_file(self):
+        """从磁盘恢复交易对缓存，重启后在TTL内无需重新下载exchangeInfo；
+        已过期的缓存同样载入，刷新失败时仍可代替备选列表使用"""
+        if not self.pairs_cache_file or not os.path.exists(self.pairs_cache_file):
+            return
+        
+        try:
+            with open(self.pairs_cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for key, entry in data.items():
+                age = time.time() - entry['saved_at']
+                if age < 0:
+                    # 系统时钟回拨导致保存时间在未来，无法判断新旧，视为已过期
+                    age = self.pairs_cache_ttl
+                if entry['symbols']:
+                    # 缓存内部使用monotonic时间，按已过去的时长换算；过期条目会在首次调用时立即刷新
+                    self._pairs_cache[key == 'futures'] = (time.monotonic() - age, entry['symbols'])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.warning("加载交易对缓存失败: %s", e)
+    
+    def _save_pairs_cache_file(self):
+        """将交易对缓存写入磁盘（先写临时文件再替换，避免写入中断损坏缓存）"""
+        if not self.pairs_cache_file:
+            return
+        
+        now_wall, now_mono = time.time(), time.monotonic()
+        data = {
+            'futures' if include_futures else 'spot': {
+                'saved_at': now_wall - (now_mono - cached_at),
+                'symbols': symbols
+            }
+            for include_futures, (cached_at, symbols) in self._pairs_cache.items()
+        }
+        # 临时文件名带进程号，多个分片进程共用同一缓存文件时互不覆盖
+        tmp_file = f"{self.pairs_cache_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_file, self.pairs_cache_file)
+        except OSError as e:
+            logger.warning("保存交易对缓存失败: %s", e)
+    
+    def _get_json(self, url: str, timeout: float, params: Optional[Dict] = None):
+        """发送GET请求并解析JSON，触发限频时进入冷却期"""
+        host = urlsplit(url).netloc
+        remaining = self._cooldown_until.get(host, 0.0) - time.monotonic()
+        if remaining > 0:
+            raise RateLimitError(f"{host} 限频冷却中，剩余 {remaining:.0f} 秒")
+        
+        response = self.session.get(url, params=params, timeout=timeout)
+        if response.status_code in (418, 429):
+            # 429为触发限频，418为持续超限后IP被封禁，优先遵循Retry-After
+            strikes = self._rate_limit_strikes.get(host, 0) + 1
+            self._rate_limit_strikes[host] = strikes
+            retry_after = response.headers.get('Retry-After', '')
+            delay = int(retry_after) if retry_after.isdigit() else min(2 ** strikes, 300)
+            self._cooldown_until[host] = time.monotonic() + delay
+            raise RateLimitError(f"{host} HTTP {response.status_code}，暂停请求 {delay} 秒")
+        
+        response.raise_for_status()
+        self._rate_limit_strikes.pop(host, None)
+        # 直接解析原始字节，省去response.json()的文本解码
+        return json_loads(response.content)
+    
     def get_exchange_info(self) -> Optional[Dict]:
         """获取交易所信息"""
         try:
-            response = self.session.get(f"{self.base_url}/api/v3/exchangeInfo", timeout=10)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            logger.error(f"获取交易所信息失败: {e}")
-            return None
+            return self._get_json(f"{self.base_url}/api/v3/exchangeInfo", timeout=10)
+        except RateLimitError as e:
+            logger.warning("获取交易所信息被限频: %s", e)
+        except requests.Timeout:
+            logger.warning("获取交易所信息超时")
+        except (requests.RequestException, ValueError) as e:
+            logger.error("获取交易所信息失败: %s", e)
+        return None
     
     def get_futures_exchange_info(self) -> Optional[Dict]:
         """获取期货交易所信息"""
         try:
-            response = self.session.get(f"{self.fapi_url}/fapi/v1/exchangeInfo", timeout=10)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            logger.error(f"获取期货交易所信息失败: {e}")
-            return None
+            return self._get_json(f"{self.fapi_url}/fapi/v1/exchangeInfo", timeout=10)
+        except RateLimitError as e:
+            logger.warning("获取期货交易所信息被限频: %s", e)
+        except requests.Timeout:
+            logger.warning("获取期货交易所信息超时")
+        except (requests.RequestException, ValueError) as e:
+            logger.error("获取期货交易所信息失败: %s", e)
+        return None
     
     def get_trading_pairs(self, include_futures: bool = True) -> List[str]:
         """获取交易对列表"""
+        cached = self._pairs_cache.get(include_futures)
+        if cached and time.monotonic() - cached[0] < self.pairs_cache_ttl:
+            return cached[1]
+        
         symbols = []
         
         try:
+            # 现货与期货交易所信息互不依赖，并发请求以重叠网络等待
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                spot_future = executor.submit(self.get_exchange_info)
+                futures_future = executor.submit(self.get_futures_exchange_info) if include_futures else None
+                spot_info = spot_future.result()
+                futures_info = futures_future.result() if futures_future else None
+            
             # 获取现货交易对
-            spot_info = self.get_exchange_info()
             if spot_info and 'symbols' in spot_info:
                 spot_symbols = []
                 for symbol_info in spot_info['symbols']:
@@ -177,11 +345,10 @@ class BinanceAPI:
                         symbol_info['quoteAsset'] == 'USDT'):
                         spot_symbols.append(symbol_info['symbol'])
                 symbols.extend(spot_symbols[:25])  # 限制现货交易对数量
-                logger.info(f"获取到 {len(spot_symbols)} 个现货交易对，选择前 25 个")
+                logger.info("获取到 %s 个现货交易对，选择前 25 个", len(spot_symbols))
             
             # 获取期货交易对
             if include_futures:
-                futures_info = self.get_futures_exchange_info()
                 if futures_info and 'symbols' in futures_info:
                     futures_symbols = []
                     for symbol_info in futures_info['symbols']:
@@ -190,103 +357,237 @@ class BinanceAPI:
                             symbol_info['contractType'] == 'PERPETUAL'):
                             futures_symbols.append(symbol_info['symbol'])
                     symbols.extend(futures_symbols[:25])  # 限制期货交易对数量
-                    logger.info(f"获取到 {len(futures_symbols)} 个期货交易对，选择前 25 个")
+                    logger.info("获取到 %s 个期货交易对，选择前 25 个", len(futures_symbols))
+            
+            if not symbols:
+                return self._pairs_fallback(cached)
+            
+            # 现货与期货存在同名交易对，去重并保持原有顺序
+            symbols = list(dict.fromkeys(symbols))
             
-            if symbols:
+            # 任一交易所信息获取失败时只得到部分列表，不写入缓存，避免残缺列表被沿用整个TTL
+            complete = bool(spot_info and 'symbols' in spot_info) and (
+                not include_futures or bool(futures_info and 'symbols' in futures_info))
+            if not complete:
+                if cached:
+                    return self._pairs_fallback(cached)
+                logger.warning("交易所信息获取不完整，本轮临时使用 %s 个交易对", len(symbols))
                 return symbols
-            else:
-                logger.warning("未能获取交易对，使用备选列表")
-                return self.fallback_symbols
+            
+            self._pairs_cache[include_futures] = (time.monotonic(), symbols)
+            self._save_pairs_cache_file()
+            return symbols
                 
         except Exception as e:
-            logger.error(f"获取交易对失败: {e}")
-            return self.fallback_symbols
+            logger.error("获取交易对失败: %s", e)
+            return self._pairs_fallback(cached)
+    
+    def _pairs_fallback(self, cached: Optional[Tuple[float, List[str]]]) -> List[str]:
+        """刷新失败时优先沿用已过期的缓存，其次才使用备选列表"""
+        if cached:
+            # 交易对很少变化，过期列表仍比固定备选列表准确；缓存时间不更新，下一轮继续尝试刷新
+            logger.warning("刷新交易对失败，沿用上次获取的 %s 个交易对", len(cached[1]))
+            return cached[1]
+        logger.warning("未能获取交易对，使用备选列表")
+        return self.fallback_symbols
     
     def get_24hr_ticker(self, symbols: List[str]) -> Dict[str, CryptoPrice]:
         """获取24小时价格统计"""
         prices = {}
+        wanted = set(symbols)
         
         try:
-            response = self.session.get(f"{self.base_url}/api/v3/ticker/24hr", timeout=15)
-            response.raise_for_status()
-            tickers = response.json()
-            
-            for ticker in tickers:
-                symbol = ticker['symbol']
-                if symbol in symbols:
-                    try:
-                        price = CryptoPrice(
-                            symbol=symbol,
-                            price=float(ticker['lastPrice']),
-                            change_24h=float(ticker['priceChangePercent']),
-                            volume_24h=float(ticker['volume']),
-                            timestamp=datetime.now()
-                        )
-                        prices[symbol] = price
-                    except (ValueError, KeyError) as e:
-                        logger.warning(f"解析 {symbol} 数据失败: {e}")
-                        continue
-            
-            return prices
-            
-        except Exception as e:
-            logger.error(f"获取价格数据失败: {e}")
+            tickers = self._fetch_tickers(wanted)
+        except RateLimitError as e:
+            logger.warning("获取价格数据被限频: %s", e)
+            return {}
+        except requests.Timeout:
+            logger.warning("获取价格数据超时")
             return {}
+        except (requests.RequestException, ValueError) as e:
+            logger.error("获取价格数据失败: %s", e)
+            return {}
+        
+        # 回退到全量行情时约两千条，按集合过滤
+        # 同一次响应中的行情共用一个时间戳
+        fetched_at = datetime.now()
+        for ticker in tickers:
+            symbol = ticker.get('symbol')
+            if symbol in wanted:
+                try:
+                    last_price = float(ticker['lastPrice'])
+                    if last_price <= 0:
+                        # 暂停交易的交易对最新价为0，无参考意义且会导致间隔涨跌幅除零
+                        logger.debug("%s 最新价格无效，跳过", symbol)
+                        continue
+                    price = CryptoPrice(
+                        symbol=symbol,
+                        price=last_price,
+                        change_24h=float(ticker['priceChangePercent']),
+                        volume_24h=float(ticker['volume']),
+                        quote_volume_24h=float(ticker['quoteVolume']),
+                        timestamp=fetched_at
+                    )
+                    prices[symbol] = price
+                except (ValueError, KeyError) as e:
+                    logger.warning("解析 %s 数据失败: %s", symbol, e)
+                    continue
+        
+        return prices
+    
+    def _fetch_tickers(self, wanted: set) -> List[Dict]:
+        """请求24hr行情，优先只取需要的交易对，被拒绝时回退到全量行情"""
+        url = f"{self.base_url}/api/v3/ticker/24hr"
+        if not 0 < len(wanted) <= self.TICKER_SYMBOLS_LIMIT or wanted == self._rejected_ticker_symbols:
+            return self._get_json(url, timeout=15)
+        
+        params = {'symbols': json.dumps(sorted(wanted), separators=(',', ':'))}
+        try:
+            return self._get_json(url, timeout=15, params=params)
+        except requests.HTTPError as e:
+            # 列表中含仅有合约的交易对（如1000PEPEUSDT）时整个请求返回400
+            if e.response is None or e.response.status_code != 400:
+                raise
+            logger.info("按交易对请求行情被拒绝，改为获取全量行情")
+            self._rejected_ticker_symbols = frozenset(wanted)
+            return self._get_json(url, timeout=15)
 
 class PushService:
     """推送服务类"""
     
+    # 企业微信文本消息内容上限为2048字节
+    MAX_CONTENT_BYTES = 2048
+    
+    # 预编译的警报文本模板，时间只在每条消息末尾格式化一次
+    ALERT_TEMPLATE = (
+        "🚨 【{symbol}】 {alert_type}\n"
+        "当前价格: ${current_price:.4f}\n"
+        "变化幅度: {change_percent:+.2f}%"
+    )
+    INTERVAL_ALERT_TEMPLATE = (
+        "🚨 【{symbol}】 {alert_type}\n"
+        "当前价格: ${current_price:.4f}\n"
+        "前次价格: ${previous_price:.4f}\n"
+        "变化幅度: {change_percent:+.2f}%"
+    )
+    FOOTER_TEMPLATE = "⏰ 时间: {time}"
+    
     def __init__(self, config: Dict):
         self.config = config
         self.webhook_url = config.get('webhook_url', '')
         self.enable_push = config.get('enable_push', False)
         self.push_cooldown = config.get('push_cooldown', 300)  # 5分钟冷却
-        self.last_push_time = {}
+        # 使用monotonic时间记录，系统时钟回拨或NTP校时不会影响冷却判断
+        self.last_push_time: Dict[Tuple[str, AlertType], float] = {}
+        self._session: Optional[requests.Session] = None
     
-    def should_push(self, symbol: str) -> bool:
-        """检查是否应该推送"""
+    @property
+    def session(self) -> requests.Session:
+        """推送会话，首次推送时才创建（推送功能默认关闭）"""
+        if self._session is None:
+            # 持久化会话复用TCP/TLS连接，避免每条推送重新握手
+            session = requests.Session()
+            # POST只重试连接错误：读超时或网关返回的5xx/429并不代表消息未送达，重试可能重复推送，
+            # 且遵循Retry-After会在监控周期内长时间阻塞；状态码交由send_alerts按失败处理
+            retry = Retry(
+                total=3,
+                read=False,
+                status=0,
+                backoff_factor=0.3,
+                allowed_methods=frozenset(['POST']),
+                respect_retry_after_header=False,
+                raise_on_status=False
+            )
+            session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+            session.headers.update({'Content-Type': 'application/json'})
+            self._session = session
+        return self._session
+    
+    def should_push(self, key: Tuple[str, AlertType]) -> bool:
+        """检查是否应该推送（同一交易对的同类警报在冷却期内只推送一次）"""
         if not self.enable_push:
             return False
         
-        current_time = time.time()
-        last_time = self.last_push_time.get(symbol, 0)
+        last_time = self.last_push_time.get(key)
+        if last_time is None:
+            return True
         
-        return (current_time - last_time) >= self.push_cooldown
+        return (time.monotonic() - last_time) >= self.push_cooldown
+    
+    def format_alert(self, alert: AlertInfo) -> str:
+        """格式化单条警报文本"""
+        template = self.ALERT_TEMPLATE if alert.previous_price is None else self.INTERVAL_ALERT_TEMPLATE
+        return template.format_map({
+            'symbol': alert.symbol,
+            'alert_type': alert.alert_type.value.upper(),
+            'current_price': alert.current_price,
+            'previous_price': alert.previous_price,
+            'change_percent': alert.change_percent
+        })
     
-    def send_alert(self, alert: AlertInfo) -> PushStatus:
-        """发送警报推送"""
-        if not self.should_push(alert.symbol):
-            alert.push_status = PushStatus.SKIPPED
-            return PushStatus.SKIPPED
+    def build_batches(self, alerts: List[AlertInfo]) -> List[Tuple[List[AlertInfo], str]]:
+        """将警报合并为若干条不超过长度限制的消息"""
+        batches = []
+        # 同一轮警报共享行情时间戳，只格式化一次
+        footer = self.FOOTER_TEMPLATE.format(time=alerts[0].timestamp.strftime('%Y-%m-%d %H:%M:%S'))
+        footer_size = len(footer.encode('utf-8')) + 2
+        batch_alerts, blocks, size = [], [], footer_size
         
-        try:
-            if self.webhook_url:
-                # 模拟推送到webhook
-                message = {
-                    "symbol": alert.symbol,
-                    "type": alert.alert_type.value,
-                    "price": alert.current_price,
-                    "change": alert.change_percent,
-                    "timestamp": alert.timestamp.isoformat()
-                }
-                
-                # 这里可以添加实际的HTTP请求
-                # response = requests.post(self.webhook_url, json=message, timeout=5)
-                # response.raise_for_status()
-                
-                # 模拟成功
-                self.last_push_time[alert.symbol] = time.time()
-                alert.push_status = PushStatus.SUCCESS
-                return PushStatus.SUCCESS
-            else:
+        for alert in alerts:
+            block = self.format_alert(alert)
+            block_size = len(block.encode('utf-8')) + 2  # 警报之间的空行
+            if blocks and size + block_size > self.MAX_CONTENT_BYTES:
+                batches.append((batch_alerts, "\n\n".join(blocks + [footer])))
+                batch_alerts, blocks, size = [], [], footer_size
+            batch_alerts.append(alert)
+            blocks.append(block)
+            size += block_size
+        
+        if blocks:
+            batches.append((batch_alerts, "\n\n".join(blocks + [footer])))
+        return batches
+    
+    def send_alerts(self, alerts: List[AlertInfo]):
+        """去重后将本轮警报合并推送，每批只发送一次请求"""
+        pending = []
+        seen = set()
+        for alert in alerts:
+            key = (alert.symbol, alert.alert_type)
+            if key in seen or not self.should_push(key):
+                alert.push_status = PushStatus.SKIPPED
+                continue
+            seen.add(key)
+            pending.append(alert)
+        
+        if not pending:
+            return
+        
+        if not self.webhook_url:
+            for alert in pending:
                 alert.push_status = PushStatus.SKIPPED
                 alert.error_message = "未配置推送URL"
-                return PushStatus.SKIPPED
-                
-        except Exception as e:
-            alert.push_status = PushStatus.FAILED
-            alert.error_message = str(e)
-            return PushStatus.FAILED
+            return
+        
+        for batch, content in self.build_batches(pending):
+            error_message = None
+            try:
+                message = {"msgtype": "text", "text": {"content": content}}
+                response = self.session.post(self.webhook_url, data=json_dumps(message), timeout=5)
+                response.raise_for_status()
+                result = json_loads(response.content)
+                if result.get('errcode', 0) != 0:
+                    error_message = f"推送接口返回错误: {result}"
+            except Exception as e:
+                error_message = str(e)
+            
+            push_time = time.monotonic()
+            for alert in batch:
+                if error_message:
+                    alert.push_status = PushStatus.FAILED
+                    alert.error_message = error_message
+                else:
+                    self.last_push_time[(alert.symbol, alert.alert_type)] = push_time
+                    alert.push_status = PushStatus.SUCCESS
 
 class EnhancedCryptoMonitor:
     """增强版加密货币监控系统"""
@@ -295,19 +596,42 @@ class EnhancedCryptoMonitor:
         self.config = config
         self.binance = BinanceAPI(
             api_key=config.get('binance_api_key'),
-            api_secret=config.get('binance_api_secret')
+            api_secret=config.get('binance_api_secret'),
+            pairs_cache_ttl=config.get('symbols_refresh_interval', 3600),
+            pairs_cache_file=config.get('symbols_cache_file', '')
         )
         self.push_service = PushService(config)
         self.detailed_logger = DetailedLogger()
-        self.previous_prices = {}
-        self.alert_history = []
+        self.previous_prices: Dict[str, float] = {}
+        # 阈值在运行期间不变，初始化时读取一次，避免每个交易对重复查询配置
+        self.price_change_threshold = config.get('price_change_threshold', 5.0)
+        self.volume_threshold = config.get('volume_threshold', 1000000)
+        self.min_quote_volume = config.get('min_quote_volume', 0)
+        # 分片：多个进程各自监控交易对列表的一个子集，分摊单IP的限频额度
+        self.shard_id = config.get('shard_id', 0)
+        self.shard_count = config.get('shard_count', 1)
+        if self.shard_count < 1 or not 0 <= self.shard_id < self.shard_count:
+            raise ValueError(f"分片配置无效: shard_id={self.shard_id}, shard_count={self.shard_count}")
+        # 警报历史只保留最近的记录，避免长时间运行时内存无限增长
+        self.alert_history = deque(maxlen=config.get('alert_history_size', 1000))
+        self.total_alerts = 0
         self.cycle_count = 0
         
+        # 停止事件：周期间的等待可被信号处理函数立即打断
+        self._stop_event = threading.Event()
+        
         logger.info("增强版加密货币监控系统初始化完成")
     
+    def stop(self):
+        """请求停止监控（可在信号处理函数中调用）"""
+        self._stop_event.set()
+    
     def get_monitored_symbols(self) -> List[str]:
         """获取监控交易对列表"""
         symbols = self.binance.get_trading_pairs(include_futures=True)
+        if self.shard_count > 1:
+            # 按位置交错取子集，各分片分到的活跃交易对数量大致相同
+            symbols = symbols[self.shard_id::self.shard_count]
         max_symbols = self.config.get('max_symbols', 30)
         
         if len(symbols) > max_symbols:
@@ -318,8 +642,8 @@ class EnhancedCryptoMonitor:
     def check_alert_conditions(self, symbol: str, current_price: CryptoPrice) -> List[AlertInfo]:
         """检查警报条件"""
         alerts = []
-        threshold = self.config.get('price_change_threshold', 5.0)
-        volume_threshold = self.config.get('volume_threshold', 1000000)
+        threshold = self.price_change_threshold
+        volume_threshold = self.volume_threshold
         
         # 检查24小时价格变化
         if abs(current_price.change_24h) >= threshold:
@@ -351,8 +675,8 @@ class EnhancedCryptoMonitor:
             alerts.append(alert)
         
         # 检查间隔价格变化
-        if symbol in self.previous_prices:
-            prev_price = self.previous_prices[symbol].price
+        prev_price = self.previous_prices.get(symbol)
+        if prev_price is not None:
             price_change = ((current_price.price - prev_price) / prev_price) * 100
             
             if abs(price_change) >= threshold:
@@ -372,17 +696,17 @@ class EnhancedCryptoMonitor:
     
     def process_alerts(self, alerts: List[AlertInfo]):
         """处理警报推送"""
-        for alert in alerts:
-            push_status = self.push_service.send_alert(alert)
-            alert.push_status = push_status
-            self.alert_history.append(alert)
+        self.push_service.send_alerts(alerts)
+        self.alert_history.extend(alerts)
+        self.total_alerts += len(alerts)
     
-    def display_monitoring_results(self, symbols: List[str], current_prices: Dict[str, CryptoPrice], alerts: List[AlertInfo]):
+    def display_monitoring_results(self, symbols: List[str], current_prices: Dict[str, CryptoPrice],
+                                   alerts: List[AlertInfo], cycle_time: datetime):
         """显示监控结果"""
         self.cycle_count += 1
         
         # 显示监控周期头部信息
-        self.detailed_logger.print_header(f"监控周期 #{self.cycle_count} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        self.detailed_logger.print_header(f"监控周期 #{self.cycle_count} - {cycle_time.strftime('%Y-%m-%d %H:%M:%S')}")
         
         # 显示基本统计信息
         print(f"📊 监控统计: {len(current_prices)}/{len(symbols)} 个交易对获取成功")
@@ -393,12 +717,13 @@ class EnhancedCryptoMonitor:
         # 显示所有交易对价格信息
         self.detailed_logger.print_section("交易对价格监控")
         
+        # 触发警报的交易对集合，避免对每个交易对重新扫描整个警报列表
+        alerted_symbols = {a.symbol for a in alerts}
         for symbol in symbols:
             if symbol in current_prices:
                 price_data = current_prices[symbol]
                 # 检查是否符合推送条件
-                symbol_alerts = [a for a in alerts if a.symbol == symbol]
-                meets_criteria = len(symbol_alerts) > 0
+                meets_criteria = symbol in alerted_symbols
                 self.detailed_logger.print_price_info(symbol, price_data, meets_criteria)
             else:
                 print(f"❌ {symbol:<12} | 获取价格失败")
@@ -414,14 +739,13 @@ class EnhancedCryptoMonitor:
         
         # 显示推送统计
         if alerts:
-            success_count = len([a for a in alerts if a.push_status == PushStatus.SUCCESS])
-            failed_count = len([a for a in alerts if a.push_status == PushStatus.FAILED])
-            skipped_count = len([a for a in alerts if a.push_status == PushStatus.SKIPPED])
+            # 一次遍历统计各推送状态
+            status_counts = Counter(a.push_status for a in alerts)
             
             print(f"\n📤 推送统计:")
-            print(f"   ✅ 成功: {success_count}")
-            print(f"   ❌ 失败: {failed_count}")
-            print(f"   ⏭️  跳过: {skipped_count}")
+            print(f"   ✅ 成功: {status_counts[PushStatus.SUCCESS]}")
+            print(f"   ❌ 失败: {status_counts[PushStatus.FAILED]}")
+            print(f"   ⏭️  跳过: {status_counts[PushStatus.SKIPPED]}")
         
         print(f"\n⏰ 等待 {self.config.get('monitor_interval', 60)} 秒后继续下一轮监控...")
         print("\n" + "=" * 80)
@@ -443,9 +767,14 @@ class EnhancedCryptoMonitor:
                 logger.error("未能获取价格数据")
                 return 0, []
             
-            # 检查警报条件
+            # 本周期的时间取自行情时间戳，警报、推送与输出共用同一时刻
+            cycle_time = next(iter(current_prices.values())).timestamp
+            
+            # 检查警报条件，先用24h成交额过滤掉不活跃的交易对
             all_alerts = []
             for symbol, price_data in current_prices.items():
+                if price_data.quote_volume_24h < self.min_quote_volume:
+                    continue
                 alerts = self.check_alert_conditions(symbol, price_data)
                 all_alerts.extend(alerts)
             
@@ -453,15 +782,15 @@ class EnhancedCryptoMonitor:
             self.process_alerts(all_alerts)
             
             # 显示详细监控结果
-            self.display_monitoring_results(symbols, current_prices, all_alerts)
+            self.display_monitoring_results(symbols, current_prices, all_alerts, cycle_time)
             
-            # 更新历史价格
-            self.previous_prices.update(current_prices)
+            # 更新历史价格，只保留价格数值而非整个CryptoPrice对象
+            self.previous_prices.update({symbol: price_data.price for symbol, price_data in current_prices.items()})
             
             return len(current_prices), all_alerts
             
         except Exception as e:
-            logger.error(f"监控周期执行失败: {e}")
+            logger.error("监控周期执行失败: %s", e)
             return 0, []
     
     def start_monitoring(self):
@@ -476,101 +805,132 @@ class EnhancedCryptoMonitor:
         print(f"   推送功能: {'启用' if self.config.get('enable_push', False) else '禁用'}")
         
         try:
-            while True:
-                start_time = time.time()
-                
+            interval = self.config.get('monitor_interval', 60)
+            next_tick = time.monotonic()
+            
+            while not self._stop_event.is_set():
                 # 运行监控周期
                 updated_count, alerts = self.run_monitoring_cycle()
                 
-                # 等待下一个监控周期
-                time.sleep(self.config.get('monitor_interval', 60))
+                # 按固定节拍等待下一个监控周期，执行耗时不会累积成漂移
+                next_tick += interval
+                delay = next_tick - time.monotonic()
+                if delay < 0:
+                    logger.warning("监控周期超时 %.1f 秒，立即开始下一轮", -delay)
+                    # 重新对齐节拍，避免为追赶错过的周期而连续执行
+                    next_tick = time.monotonic()
+                    delay = 0
+                if self._stop_event.wait(delay):
+                    break
                 
         except KeyboardInterrupt:
-            self.detailed_logger.print_header("监控系统正在关闭")
-            print("👋 收到停止信号，正在安全关闭监控系统...")
-            print(f"📊 总监控周期: {self.cycle_count}")
-            print(f"📈 总警报数量: {len(self.alert_history)}")
+            pass
         except Exception as e:
-            logger.error(f"监控系统异常: {e}")
+            logger.error("监控系统异常: %s", e)
             raise
+        
+        self.detailed_logger.print_header("监控系统正在关闭")
+        print("👋 收到停止信号，正在安全关闭监控系统...")
+        print(f"📊 总监控周期: {self.cycle_count}")
+        print(f"📈 总警报数量: {self.total_alerts}")
+
+CONFIG_FILE = 'config.json'
+
+# 默认配置，load_config与create_default_config共用同一份
+DEFAULT_CONFIG = {
+    'binance_api_key': '',
+    'binance_api_secret': '',
+    'monitor_interval': 60,
+    'price_change_threshold': 5.0,
+    'volume_threshold': 1000000,
+    'max_symbols': 30,
+    'min_quote_volume': 0,
+    'symbols_refresh_interval': 3600,
+    'symbols_cache_file': 'crypto_monitor_cache.json',
+    'enable_push': False,
+    'webhook_url': '',
+    'push_cooldown': 300,
+    'alert_history_size': 1000,
+    'shard_id': 0,
+    'shard_count': 1,
+    'log_level': 'INFO',
+    'log_file': 'crypto_monitor.log'
+}
+
+# 环境变量名 -> (配置项, 类型转换)，仅在环境变量已设置时覆盖配置文件
+ENV_OVERRIDES = {
+    'BINANCE_API_KEY': ('binance_api_key', str),
+    'BINANCE_API_SECRET': ('binance_api_secret', str),
+    'MONITOR_INTERVAL': ('monitor_interval', float),
+    'PRICE_CHANGE_THRESHOLD': ('price_change_threshold', float),
+    'VOLUME_THRESHOLD': ('volume_threshold', float),
+    'MAX_SYMBOLS': ('max_symbols', int),
+    'MIN_QUOTE_VOLUME': ('min_quote_volume', float),
+    'SYMBOLS_REFRESH_INTERVAL': ('symbols_refresh_interval', float),
+    'SYMBOLS_CACHE_FILE': ('symbols_cache_file', str),
+    'ENABLE_PUSH': ('enable_push', lambda value: value.lower() == 'true'),
+    'WEBHOOK_URL': ('webhook_url', str),
+    'PUSH_COOLDOWN': ('push_cooldown', int),
+    'ALERT_HISTORY_SIZE': ('alert_history_size', int),
+    'SHARD_ID': ('shard_id', int),
+    'SHARD_COUNT': ('shard_count', int),
+    'LOG_LEVEL': ('log_level', str),
+    'LOG_FILE': ('log_file', str)
+}
 
 def load_config() -> Dict:
     """加载配置"""
-    config_file = 'config.json'
-    default_config = {
-        'binance_api_key': '',
-        'binance_api_secret': '',
-        'monitor_interval': 60,
-        'price_change_threshold': 5.0,
-        'volume_threshold': 1000000,
-        'max_symbols': 30,
-        'enable_push': False,
-        'webhook_url': '',
-        'push_cooldown': 300,
-        'log_level': 'INFO'
-    }
+    default_config = dict(DEFAULT_CONFIG)
     
-    if os.path.exists(config_file):
+    if os.path.exists(CONFIG_FILE):
         try:
-            with open(config_file, 'r', encoding='utf-8') as f:
+            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
                 file_config = json.load(f)
                 default_config.update(file_config)
         except Exception as e:
-            logger.warning(f"加载配置文件失败: {e}，使用默认配置")
+            logger.warning("加载配置文件失败: %s，使用默认配置", e)
     
     # 环境变量覆盖
-    env_config = {
-        'binance_api_key': os.getenv('BINANCE_API_KEY', ''),
-        'binance_api_secret': os.getenv('BINANCE_API_SECRET', ''),
-        'monitor_interval': float(os.getenv('MONITOR_INTERVAL', 60)),
-        'price_change_threshold': float(os.getenv('PRICE_CHANGE_THRESHOLD', 5.0)),
-        'volume_threshold': float(os.getenv('VOLUME_THRESHOLD', 1000000)),
-        'max_symbols': int(os.getenv('MAX_SYMBOLS', 30)),
-        'enable_push': os.getenv('ENABLE_PUSH', 'false').lower() == 'true',
-        'webhook_url': os.getenv('WEBHOOK_URL', ''),
-        'push_cooldown': int(os.getenv('PUSH_COOLDOWN', 300))
-    }
-    
-    for key, value in env_config.items():
-        if value or isinstance(value, (int, float, bool)):
-            default_config[key] = value
+    for env_name, (key, convert) in ENV_OVERRIDES.items():
+        value = os.getenv(env_name)
+        if value:
+            default_config[key] = convert(value)
     
     return default_config
 
+def get_log_file(config: Dict) -> str:
+    """返回日志文件路径；多分片运行时按分片编号区分文件，避免多个进程轮转同一个文件"""
+    log_file = config.get('log_file', '')
+    if log_file and config.get('shard_count', 1) > 1:
+        root, ext = os.path.splitext(log_file)
+        log_file = f"{root}.{config.get('shard_id', 0)}{ext}"
+    return log_file
+
 def create_default_config():
     """创建默认配置文件"""
-    config_file = 'config.json'
-    if not os.path.exists(config_file):
-        default_config = {
-            "binance_api_key": "",
-            "binance_api_secret": "",
-            "monitor_interval": 60,
-            "price_change_threshold": 5.0,
-            "volume_threshold": 1000000,
-            "max_symbols": 30,
-            "enable_push": false,
-            "webhook_url": "",
-            "push_cooldown": 300,
-            "log_level": "INFO"
-        }
-        
+    if not os.path.exists(CONFIG_FILE):
         try:
-            with open(config_file, 'w', encoding='utf-8') as f:
-                json.dump(default_config, f, indent=2, ensure_ascii=False)
-            logger.info(f"已创建默认配置文件: {config_file}")
+            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
+                json.dump(DEFAULT_CONFIG, f, indent=2, ensure_ascii=False)
+            logger.info("已创建默认配置文件: %s", CONFIG_FILE)
         except Exception as e:
-            logger.error(f"创建配置文件失败: {e}")
+            logger.error("创建配置文件失败: %s", e)
 
 def main():
     """主函数"""
+    log_listener = setup_logging()
     try:
         create_default_config()
         config = load_config()
         
+        # 按配置的级别与日志文件重建日志；stop()会先输出队列中已有的记录
         log_level = getattr(logging, config.get('log_level', 'INFO').upper())
-        logging.getLogger().setLevel(log_level)
+        log_listener.stop()
+        log_listener = setup_logging(log_level, get_log_file(config))
         
         monitor = EnhancedCryptoMonitor(config)
+        # 收到SIGTERM（如docker stop、systemctl stop）时结束当前等待并正常退出
+        signal.signal(signal.SIGTERM, lambda signum, frame: monitor.stop())
         monitor.start_monitoring()
         
         return 0
@@ -578,8 +938,11 @@ def main():
     except KeyboardInterrupt:
         return 0
     except Exception as e:
-        logger.error(f"程序执行失败: {e}")
+        logger.error("程序执行失败: %s", e)
         return 1
+    finally:
+        # 停止后台线程前会先输出队列中剩余的日志
+        log_listener.stop()
 
 if __name__ == "__main__":
     exit(main())